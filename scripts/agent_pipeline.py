@@ -5,32 +5,155 @@ MVP agent pipeline: Notion -> local git -> GitHub PR.
 Requirements:
 - Python 3.10+
 - requests
-- git + gh CLI
+- git
+- orjson (optional, faster JSON parsing/serialization)
 
 Env vars:
 - NOTION_TOKEN
 - NOTION_DATABASE_ID
 - GITHUB_REPO (e.g. XSWClevo/ai-agent-mvp)
+- GITHUB_TOKEN (required unless DRY_RUN=1; used to open PRs via the REST API)
+- BASE_BRANCH (default: main, PR target branch)
 - BRANCH_PREFIX (default: feature)
 - DRY_RUN (1 to skip git/gh actions)
-- WAIT_FOR_CI (1 to block until `gh pr checks` completes)
+- WAIT_FOR_CI (1 to poll the PR's check runs until they complete)
+- PIPELINE_WORKERS (default: 8, number of tasks processed concurrently)
+- NOTION_CACHE (1 to skip unchanged Notion updates and mock re-validation via ~/.cache/ai-agent-mvp/state.db)
+- BATCH_PR (1 to commit all tasks' mocks on one branch and open a single PR)
 """
 
 from __future__ import annotations
 
+import atexit
+import hashlib
 import json
 import os
+import re
+import sqlite3
 import subprocess
 import sys
-from dataclasses import dataclass
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
 from datetime import date
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:  # optional; fall back to the stdlib encoder
+    orjson = None
 
 NOTION_API = "https://api.notion.com/v1"
 NOTION_VERSION = "2022-06-28"
+GITHUB_API = "https://api.github.com"
+GITHUB_API_VERSION = "2022-11-28"
+CI_WAIT_TIMEOUT = 30 * 60
+# Give up if CI has not registered a single check run by then (repo without workflows).
+CI_NO_CHECKS_GRACE = 120
+STATE_DB_PATH = Path.home() / ".cache" / "ai-agent-mvp" / "state.db"
+_SAFE_TITLE_RE = re.compile(r"[^\w -]+")
+# Pretty-printed (2-space) mock skeleton; only task_id and title vary, filled in as JSON strings.
+_MOCK_TEMPLATE = b"""{
+  "task_id": %s,
+  "title": %s,
+  "description": "mock purpose and scope",
+  "inputs": {
+    "params": {},
+    "body": {}
+  },
+  "outputs": {
+    "status": 200,
+    "body": {}
+  },
+  "cases": [
+    {
+      "name": "happy-path",
+      "inputs": {},
+      "expected": {}
+    }
+  ],
+  "notes": "edge cases / exclusions"
+}
+"""
+MOCK_REQUIRED_FIELDS = frozenset({"task_id", "title", "description", "inputs", "outputs", "cases", "notes"})
+
+
+def _build_adapter(pool_size: int = 16, methods: Tuple[str, ...] = ("GET", "POST", "PATCH")) -> HTTPAdapter:
+    retry = Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(methods),
+        raise_on_status=False,
+    )
+    return HTTPAdapter(pool_connections=16, pool_maxsize=pool_size, max_retries=retry)
+
+
+def _mount_adapters(session: requests.Session, pool_size: int = 16) -> None:
+    session.mount("https://", _build_adapter(pool_size))
+    # Creating a PR is not idempotent: a retried POST after a 5xx/timeout that GitHub actually
+    # handled fails with 422 "already exists", so only GitHub reads are retried.
+    session.mount(GITHUB_API, _build_adapter(pool_size, methods=("GET",)))
+
+
+def _build_session() -> requests.Session:
+    # One keep-alive pool shared by all workers instead of a new TLS handshake per call.
+    session = requests.Session()
+    _mount_adapters(session)
+    return session
+
+
+_SESSION = _build_session()
+
+
+def json_loads(data: bytes) -> Any:
+    return orjson.loads(data) if orjson else json.loads(data)
+
+
+def json_dumps_str(value: str) -> bytes:
+    # Same bytes either way: a quoted, escaped JSON string in raw UTF-8 (no \u escapes).
+    if orjson:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False).encode("utf-8")
+
+
+class TokenBucket:
+    """Client-side rate limiter shared by all threads: `rate` calls/sec, bursts of up to `burst`."""
+
+    def __init__(self, rate: float = 3.0, burst: int = 5) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            # Reserve a token even if it drives the balance negative, then sleep off the debt
+            # outside the lock so other threads can queue up behind us.
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+
+
+# Notion allows ~3 requests/sec per integration; parallel workers would otherwise trip 429s.
+_NOTION_BUCKET = TokenBucket(rate=3.0, burst=5)
+
+# Commits are built with plumbing and can be created from any thread, but anything touching the
+# shared index or remote (status, push) runs one job at a time on this worker.
+_GIT_WORKER = ThreadPoolExecutor(max_workers=1, thread_name_prefix="git")
+atexit.register(_GIT_WORKER.shutdown)
 
 
 @dataclass
@@ -38,8 +161,16 @@ class Config:
     notion_token: str
     notion_database_id: str
     github_repo: str
+    github_token: str = ""
+    base_branch: str = "main"
     branch_prefix: str = "feature"
     dry_run: bool = False
+    notion_cache: bool = False
+    batch_pr: bool = False
+    workers: int = 8
+    # Built once in load_config(); identical for every request in a run.
+    notion_headers: Dict[str, str] = field(default_factory=dict, repr=False)
+    github_headers: Dict[str, str] = field(default_factory=dict, repr=False)
 
 
 @dataclass
@@ -54,8 +185,13 @@ def run(cmd: List[str], cwd: Optional[Path] = None) -> None:
     subprocess.run(cmd, cwd=cwd, check=True)
 
 
-def sh(cmd: List[str], cwd: Optional[Path] = None) -> str:
-    res = subprocess.run(cmd, cwd=cwd, check=True, stdout=subprocess.PIPE, text=True)
+def sh(
+    cmd: List[str],
+    cwd: Optional[Path] = None,
+    input: Optional[str] = None,
+    env: Optional[Dict[str, str]] = None,
+) -> str:
+    res = subprocess.run(cmd, cwd=cwd, check=True, stdout=subprocess.PIPE, text=True, input=input, env=env)
     return res.stdout.strip()
 
 
@@ -66,45 +202,79 @@ def load_config() -> Config:
     if not token or not dbid or not repo:
         print("Missing required env vars: NOTION_TOKEN, NOTION_DATABASE_ID, GITHUB_REPO", file=sys.stderr)
         sys.exit(2)
+    dry_run = os.environ.get("DRY_RUN", "").strip() == "1"
+    gh_token = os.environ.get("GITHUB_TOKEN", "").strip()
+    if not gh_token and not dry_run:
+        print("Missing required env var: GITHUB_TOKEN (or set DRY_RUN=1)", file=sys.stderr)
+        sys.exit(2)
     return Config(
         notion_token=token,
         notion_database_id=dbid,
         github_repo=repo,
+        github_token=gh_token,
+        base_branch=os.environ.get("BASE_BRANCH", "main").strip() or "main",
         branch_prefix=os.environ.get("BRANCH_PREFIX", "feature").strip() or "feature",
-        dry_run=os.environ.get("DRY_RUN", "").strip() == "1",
+        dry_run=dry_run,
+        notion_cache=os.environ.get("NOTION_CACHE", "").strip() == "1",
+        batch_pr=os.environ.get("BATCH_PR", "").strip() == "1",
+        workers=max(1, int(os.environ.get("PIPELINE_WORKERS", "8").strip() or "8")),
+        notion_headers={
+            "Authorization": f"Bearer {token}",
+            "Notion-Version": NOTION_VERSION,
+            "Content-Type": "application/json",
+        },
+        github_headers={
+            "Authorization": f"Bearer {gh_token}",
+            "Accept": "application/vnd.github+json",
+            "X-GitHub-Api-Version": GITHUB_API_VERSION,
+        },
     )
 
 
-def notion_headers(token: str) -> Dict[str, str]:
-    return {
-        "Authorization": f"Bearer {token}",
-        "Notion-Version": NOTION_VERSION,
-        "Content-Type": "application/json",
-    }
+def _plain_text(parts: List[Dict[str, Any]]) -> str:
+    return "".join(t.get("plain_text", "") for t in parts).strip()
 
 
-def notion_query_tasks(cfg: Config) -> List[NotionTask]:
+def _parse_task(page: Dict[str, Any]) -> NotionTask:
+    props = page.get("properties", {})
+    return NotionTask(
+        page_id=page["id"],
+        title=_plain_text(props.get("标题", {}).get("title", ())) or "Untitled",
+        description=_plain_text(props.get("描述/复现步骤", {}).get("rich_text", ())),
+        acceptance=_plain_text(props.get("验收标准/解决方案", {}).get("rich_text", ())),
+    )
+
+
+def _notion_query_page(cfg: Config, cursor: Optional[str]) -> Dict[str, Any]:
     url = f"{NOTION_API}/databases/{cfg.notion_database_id}/query"
-    payload = {
+    payload: Dict[str, Any] = {
         "filter": {
             "property": "状态",
             "status": {"equals": "待处理"},
-        }
+        },
+        "page_size": 100,
     }
-    res = requests.post(url, headers=notion_headers(cfg.notion_token), json=payload, timeout=30)
+    if cursor:
+        payload["start_cursor"] = cursor
+    _NOTION_BUCKET.acquire()
+    res = _SESSION.post(url, headers=cfg.notion_headers, json=payload, timeout=30)
     res.raise_for_status()
-    data = res.json()
+    return json_loads(res.content)
+
+
+def notion_query_tasks(cfg: Config) -> List[NotionTask]:
     tasks: List[NotionTask] = []
-    for page in data.get("results", []):
-        props = page.get("properties", {})
-        title_parts = props.get("标题", {}).get("title", [])
-        title = "".join(t.get("plain_text", "") for t in title_parts).strip() or "Untitled"
-        desc_parts = props.get("描述/复现步骤", {}).get("rich_text", [])
-        desc = "".join(t.get("plain_text", "") for t in desc_parts).strip()
-        acc_parts = props.get("验收标准/解决方案", {}).get("rich_text", [])
-        acc = "".join(t.get("plain_text", "") for t in acc_parts).strip()
-        tasks.append(NotionTask(page_id=page["id"], title=title, description=desc, acceptance=acc))
-    return tasks
+    # Request the next page before parsing the current one to hide a round-trip per page.
+    with ThreadPoolExecutor(max_workers=1) as prefetch:
+        data = _notion_query_page(cfg, None)
+        while True:
+            pending = None
+            if data.get("has_more") and data.get("next_cursor"):
+                pending = prefetch.submit(_notion_query_page, cfg, data["next_cursor"])
+            tasks.extend(_parse_task(page) for page in data.get("results", []))
+            if pending is None:
+                return tasks
+            data = pending.result()
 
 
 def build_spec(task: NotionTask) -> str:
@@ -136,10 +306,9 @@ def build_spec(task: NotionTask) -> str:
 def build_section(title: str, body: str) -> str:
     return f"## {title}\n{body.strip()}\n"
 
-def append_section(existing: str, title: str, body: str) -> str:
-    if not existing:
-        return build_section(title, body)
-    return existing.rstrip() + "\n\n---\n\n" + build_section(title, body)
+def join_sections(sections: List[str]) -> str:
+    # Joined once per task rather than re-copying the accumulated text for every appended section.
+    return "\n\n---\n\n".join(s.rstrip() for s in sections if s) + "\n"
 
 
 def update_notion_acceptance(cfg: Config, page_id: str, new_text: str, status: str) -> None:
@@ -152,36 +321,110 @@ def update_notion_acceptance(cfg: Config, page_id: str, new_text: str, status: s
             "状态": {"status": {"name": status}},
         }
     }
-    res = requests.patch(url, headers=notion_headers(cfg.notion_token), json=payload, timeout=30)
+    _NOTION_BUCKET.acquire()
+    res = _SESSION.patch(url, headers=cfg.notion_headers, json=payload, timeout=30)
     res.raise_for_status()
 
 
+class TaskStateStore:
+    """Last acceptance text/status/PR written per Notion page, plus mocks already validated,
+    so re-runs can skip no-op calls."""
+
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS task_state("
+            "page_id TEXT PRIMARY KEY, acc_hash TEXT, status TEXT, pr_url TEXT, updated_at INTEGER)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS mock_validation(path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER)"
+        )
+
+    def get(self, page_id: str) -> Optional[Tuple[str, str, Optional[str]]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT acc_hash, status, pr_url FROM task_state WHERE page_id = ?", (page_id,)
+            ).fetchone()
+
+    def put(self, page_id: str, acc_hash: str, status: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO task_state(page_id, acc_hash, status, updated_at) "
+                "VALUES (?, ?, ?, strftime('%s', 'now')) ON CONFLICT(page_id) DO UPDATE SET "
+                "acc_hash = excluded.acc_hash, status = excluded.status, updated_at = excluded.updated_at",
+                (page_id, acc_hash, status),
+            )
+
+    def put_pr(self, page_id: str, pr_url: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO task_state(page_id, pr_url, updated_at) "
+                "VALUES (?, ?, strftime('%s', 'now')) ON CONFLICT(page_id) DO UPDATE SET "
+                "pr_url = excluded.pr_url, updated_at = excluded.updated_at",
+                (page_id, pr_url),
+            )
+
+    def mock_validated(self, path: str, mtime_ns: int, size: int) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM mock_validation WHERE path = ? AND mtime_ns = ? AND size = ?",
+                (path, mtime_ns, size),
+            ).fetchone()
+        return row is not None
+
+    def put_mock_validated(self, path: str, mtime_ns: int, size: int) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO mock_validation VALUES (?, ?, ?)", (path, mtime_ns, size)
+            )
+
+
+def acceptance_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def update_notion_cached(
+    cfg: Config, state: Optional[TaskStateStore], page_id: str, new_text: str, status: str
+) -> None:
+    if state is None:
+        update_notion_acceptance(cfg, page_id, new_text, status)
+        return
+    acc_hash = acceptance_hash(new_text)
+    row = state.get(page_id)
+    if row and row[0] == acc_hash and row[1] == status:
+        print(f"Notion page {page_id} unchanged, skipping update")
+        return
+    update_notion_acceptance(cfg, page_id, new_text, status)
+    state.put(page_id, acc_hash, status)
+
+
 def ensure_mock(task: NotionTask, repo_root: Path) -> Path:
     mock_dir = repo_root / "mocks"
     mock_dir.mkdir(parents=True, exist_ok=True)
     file_path = mock_dir / f"{task.page_id.replace('-', '')}.mock.json"
     if file_path.exists():
         return file_path
-    payload = {
-        "task_id": task.page_id,
-        "title": task.title,
-        "description": "mock purpose and scope",
-        "inputs": {"params": {}, "body": {}},
-        "outputs": {"status": 200, "body": {}},
-        "cases": [{"name": "happy-path", "inputs": {}, "expected": {}}],
-        "notes": "edge cases / exclusions",
-    }
-    file_path.write_text(json.dumps(payload, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    file_path.write_bytes(_MOCK_TEMPLATE % (json_dumps_str(task.page_id), json_dumps_str(task.title)))
     return file_path
 
-def validate_mock(path: Path) -> None:
-    required = {"task_id", "title", "description", "inputs", "outputs", "cases", "notes"}
-    data = json.loads(path.read_text(encoding="utf-8"))
-    missing = required - set(data.keys())
+def validate_mock(path: Path, state: Optional[TaskStateStore] = None) -> None:
+    # With the state store, a file whose mtime/size matches an earlier successful validation
+    # (from this or a previous run) is not re-parsed; failures raise and are never recorded.
+    st = path.stat()
+    if state and state.mock_validated(str(path), st.st_mtime_ns, st.st_size):
+        return
+    # Parse straight from bytes; both orjson and json accept them, so no intermediate str decode.
+    data = json_loads(path.read_bytes())
+    missing = MOCK_REQUIRED_FIELDS - data.keys()
     if missing:
         raise ValueError(f"mock missing required fields: {', '.join(sorted(missing))}")
     if not isinstance(data.get("cases"), list) or len(data.get("cases", [])) == 0:
         raise ValueError("mock cases must be a non-empty list")
+    if state:
+        state.put_mock_validated(str(path), st.st_mtime_ns, st.st_size)
 
 
 def self_review_summary() -> str:
@@ -195,30 +438,292 @@ def self_review_summary() -> str:
 
 def git_branch_name(prefix: str, task: NotionTask) -> str:
     short_id = task.page_id.split("-")[0]
-    safe_title = "".join(c for c in task.title.lower() if c.isalnum() or c in "-_ ").strip().replace(" ", "-")
-    safe_title = safe_title[:40] if safe_title else "task"
+    safe_title = _SAFE_TITLE_RE.sub("", task.title.lower()).strip().replace(" ", "-")[:40] or "task"
     return f"{prefix}/{short_id}-{safe_title}"
 
 
-def create_branch_and_commit(repo_root: Path, branch: str, message: str) -> None:
-    run(["git", "checkout", "-b", branch], cwd=repo_root)
-    run(["git", "add", "mocks"], cwd=repo_root)
-    run(["git", "commit", "-m", message], cwd=repo_root)
+def commit_mocks(repo_root: Path, branch: str, message: str, paths: List[Path]) -> str:
+    # Builds the commit purely in the object DB (blobs -> private index -> tree -> commit -> ref),
+    # so the shared index and HEAD are never touched and tasks can commit in parallel.
+    rel_paths = [str(p.relative_to(repo_root)) for p in paths]
+    path_list = "".join(f"{rel}\n" for rel in rel_paths)
+    blobs = sh(["git", "hash-object", "-w", "--stdin-paths"], cwd=repo_root, input=path_list)
+    index_info = "".join(f"100644 blob {sha}\t{rel}\n" for sha, rel in zip(blobs.splitlines(), rel_paths))
+    base = sh(["git", "rev-parse", "HEAD"], cwd=repo_root)
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ, "GIT_INDEX_FILE": str(Path(tmp) / "index")}
+        sh(["git", "read-tree", base], cwd=repo_root, env=env)
+        sh(["git", "update-index", "--add", "--index-info"], cwd=repo_root, input=index_info, env=env)
+        tree = sh(["git", "write-tree"], cwd=repo_root, env=env)
+    commit = sh(["git", "commit-tree", tree, "-p", base, "-m", message], cwd=repo_root)
+    # Empty old value: refuse to overwrite an existing branch, like `git checkout -b` did.
+    run(["git", "update-ref", f"refs/heads/{branch}", commit, ""], cwd=repo_root)
+    print(f"[{branch} {commit[:7]}] {message}")
+    _restore_to_base(repo_root, base, paths, rel_paths)
+    return commit
+
+
+def _restore_to_base(repo_root: Path, base: str, paths: List[Path], rel_paths: List[str]) -> None:
+    # Leave the working copy as `git checkout -` used to: new mocks removed, edited ones reset to
+    # the base version. Otherwise an untracked copy blocks pulling the base once the branch merges.
+    tracked = set(sh(["git", "ls-tree", "--name-only", base, "--", *rel_paths], cwd=repo_root).splitlines())
+    for path, rel in zip(paths, rel_paths):
+        if rel in tracked:
+            blob = subprocess.run(
+                ["git", "cat-file", "blob", f"{base}:{rel}"], cwd=repo_root, check=True, stdout=subprocess.PIPE
+            )
+            path.write_bytes(blob.stdout)
+        else:
+            path.unlink(missing_ok=True)
+
 
+def changed_mocks(repo_root: Path, paths: List[Path]) -> List[Path]:
+    # Scoped to the given files: other workers' mocks may be sitting untracked in the same tree.
+    rel_paths = [str(p.relative_to(repo_root)) for p in paths]
+    output = sh(["git", "status", "--porcelain", "--", *rel_paths], cwd=repo_root)
+    dirty = {line.split(maxsplit=1)[1] for line in output.splitlines() if line.strip()}
+    return [p for p, rel in zip(paths, rel_paths) if rel in dirty]
 
-def gh_create_pr(repo_root: Path, title: str, body: str) -> str:
-    output = sh([
-        "gh", "pr", "create",
-        "--title", title,
-        "--body", body,
-        "--repo", os.environ.get("GITHUB_REPO", ""),
-    ], cwd=repo_root)
-    return output.splitlines()[-1].strip()
 
-def gh_wait_for_checks(repo_root: Path, pr_url: str) -> str:
-    # Blocks until checks complete and returns the summary text.
-    output = sh(["gh", "pr", "checks", pr_url, "--watch"], cwd=repo_root)
-    return output
+def push_branch(repo_root: Path, branch: str) -> None:
+    run(["git", "push", "-u", "origin", branch], cwd=repo_root)
+
+
+def github_create_pr(cfg: Config, branch: str, title: str, body: str) -> Dict[str, Any]:
+    owner, repo = cfg.github_repo.split("/", 1)
+    res = _SESSION.post(
+        f"{GITHUB_API}/repos/{owner}/{repo}/pulls",
+        headers=cfg.github_headers,
+        json={"title": title, "body": body, "head": branch, "base": cfg.base_branch},
+        timeout=30,
+    )
+    res.raise_for_status()
+    return res.json()
+
+
+def github_pr_head_sha(cfg: Config, pr_url: str) -> str:
+    # The recorded URL may belong to a batch PR or an old branch name, so ask GitHub for the head.
+    owner, repo = cfg.github_repo.split("/", 1)
+    number = pr_url.rstrip("/").rsplit("/", 1)[-1]
+    res = _SESSION.get(f"{GITHUB_API}/repos/{owner}/{repo}/pulls/{number}", headers=cfg.github_headers, timeout=30)
+    res.raise_for_status()
+    return res.json()["head"]["sha"]
+
+
+def poll_checks(cfg: Config, ref: str, deadline: float) -> str:
+    # Polls check runs for `ref` (sha or branch) with backoff and returns a summary, one run per line.
+    owner, repo = cfg.github_repo.split("/", 1)
+    url = f"{GITHUB_API}/repos/{owner}/{repo}/commits/{ref}/check-runs"
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        res = _SESSION.get(url, headers=cfg.github_headers, params={"per_page": 100}, timeout=30)
+        res.raise_for_status()
+        runs = res.json().get("check_runs", [])
+        if runs and all(r.get("status") == "completed" for r in runs):
+            return "\n".join(f"{r['name']}\t{r.get('conclusion')}\t{r.get('html_url', '')}" for r in runs)
+        now = time.monotonic()
+        if not runs and now - started >= CI_NO_CHECKS_GRACE:
+            return "no checks reported"
+        if now >= deadline:
+            pending = ", ".join(r["name"] for r in runs if r.get("status") != "completed")
+            return f"timed out waiting for checks: {pending}"
+        time.sleep(min(60, 2 ** attempt, max(0.0, deadline - now)))
+        attempt += 1
+
+
+def prepare_task(
+    repo_root: Path, task: NotionTask, state: Optional[TaskStateStore] = None
+) -> Tuple[List[str], Path]:
+    sections = [task.acceptance, build_section("Spec", build_spec(task))]
+    mock_path = ensure_mock(task, repo_root)
+    validate_mock(mock_path, state)
+    print(f"Mock file: {mock_path}")
+    return sections, mock_path
+
+
+def wait_for_ci_enabled() -> bool:
+    return os.environ.get("WAIT_FOR_CI", "").strip() == "1"
+
+
+def wait_for_checks(cfg: Config, head_ref: str) -> Optional[str]:
+    if not wait_for_ci_enabled():
+        return None
+    return poll_checks(cfg, head_ref, time.monotonic() + CI_WAIT_TIMEOUT)
+
+
+def finish_without_pr(
+    cfg: Config, state: Optional[TaskStateStore], task: NotionTask, sections: List[str], reason: str
+) -> str:
+    print(f"{reason}, skipping git/gh actions")
+    print(f"Updating Notion task: {task.title}")
+    update_notion_cached(cfg, state, task.page_id, join_sections(sections), status="进行中")
+    return f"{task.title}: {reason}"
+
+
+def finish_task(
+    cfg: Config,
+    state: Optional[TaskStateStore],
+    task: NotionTask,
+    sections: List[str],
+    pr_url: str,
+    checks: Optional[str],
+) -> str:
+    sections.append(build_section("PR", pr_url))
+    sections.append(build_section("Self Review", self_review_summary()))
+    if checks is not None:
+        sections.append(build_section("Test Report", checks))
+    # Notion is written once per task, with the final text and status.
+    print(f"Updating Notion task: {task.title}")
+    update_notion_cached(cfg, state, task.page_id, join_sections(sections), status="待测试")
+    return f"PR created: {pr_url}"
+
+
+def process_task(
+    cfg: Config, repo_root: Path, task: NotionTask, state: Optional[TaskStateStore] = None
+) -> str:
+    sections, mock_path = prepare_task(repo_root, task, state)
+
+    if cfg.dry_run:
+        return finish_without_pr(cfg, state, task, sections, "DRY_RUN=1")
+
+    row = state.get(task.page_id) if state else None
+    if row and row[2]:
+        pr_url = row[2]
+        head_ref = github_pr_head_sha(cfg, pr_url) if wait_for_ci_enabled() else ""
+        print(f"PR already recorded for {task.title}, skipping git/gh actions")
+    elif not _GIT_WORKER.submit(changed_mocks, repo_root, [mock_path]).result():
+        return finish_without_pr(cfg, state, task, sections, "no mock changes")
+    else:
+        pr = open_task_pr(repo_root, cfg, task, mock_path)
+        pr_url = pr["html_url"]
+        head_ref = pr["head"]["sha"]
+        if state:
+            state.put_pr(task.page_id, pr_url)
+
+    return finish_task(cfg, state, task, sections, pr_url, wait_for_checks(cfg, head_ref))
+
+
+def build_pr_body(summary: str) -> str:
+    return (
+        f"## 需求摘要\n{summary}\n\n"
+        "## 变更说明\n- 新增 mock 文件\n\n"
+        "## 测试结果\n- Mock：通过\n\n"
+        "## 自检清单\n"
+        "- [x] 覆盖主要路径与边界情况\n"
+        "- [x] mock 文件存在且字段完整\n"
+        "- [x] 失败场景有明确返回或处理\n"
+        "- [x] 变更已记录到文档/Notion\n\n"
+        "## 风险/注意事项\n- 待补充\n"
+    )
+
+
+def open_task_pr(repo_root: Path, cfg: Config, task: NotionTask, mock_path: Path) -> Dict[str, Any]:
+    branch = git_branch_name(cfg.branch_prefix, task)
+    commit_mocks(repo_root, branch, f"Add mock for {task.title}", [mock_path])
+    _GIT_WORKER.submit(push_branch, repo_root, branch).result()
+    return github_create_pr(cfg, branch, task.title, build_pr_body("- 自动生成"))
+
+
+def open_batch_pr(
+    repo_root: Path, cfg: Config, tasks: List[NotionTask], mock_paths: List[Path]
+) -> Dict[str, Any]:
+    ids = "".join(sorted(t.page_id for t in tasks))
+    short_hash = hashlib.blake2b(ids.encode("utf-8"), digest_size=4).hexdigest()
+    branch = f"{cfg.branch_prefix}/batch-{date.today():%Y%m%d}-{short_hash}"
+    title = f"Add mocks for {len(tasks)} tasks"
+    commit_mocks(repo_root, branch, title, mock_paths)
+    _GIT_WORKER.submit(push_branch, repo_root, branch).result()
+    summary = "\n".join(f"- {t.title}（Notion: {t.page_id}）" for t in tasks)
+    return github_create_pr(cfg, branch, title, build_pr_body(summary))
+
+
+def report_results(futures: Dict[Any, NotionTask]) -> int:
+    failed = 0
+    for fut in as_completed(futures):
+        task = futures[fut]
+        try:
+            print(fut.result())
+        except Exception as exc:
+            failed += 1
+            print(f"Task failed: {task.title}: {exc}", file=sys.stderr)
+    return failed
+
+
+def process_batch(
+    cfg: Config,
+    repo_root: Path,
+    tasks: List[NotionTask],
+    state: Optional[TaskStateStore],
+    pool: ThreadPoolExecutor,
+) -> int:
+    prepared: Dict[str, Tuple[List[str], Path]] = {}
+    failed = 0
+    futures = {pool.submit(prepare_task, repo_root, task, state): task for task in tasks}
+    for fut in as_completed(futures):
+        task = futures[fut]
+        try:
+            prepared[task.page_id] = fut.result()
+        except Exception as exc:
+            failed += 1
+            print(f"Task failed: {task.title}: {exc}", file=sys.stderr)
+    ready = [t for t in tasks if t.page_id in prepared]
+
+    # Tasks whose PR was recorded by an earlier run keep it; everything else shares one new PR.
+    pr_urls: Dict[str, str] = {}
+    for task in ready:
+        row = state.get(task.page_id) if state else None
+        if row and row[2]:
+            pr_urls[task.page_id] = row[2]
+            print(f"PR already recorded for {task.title}, leaving it out of the batch")
+    reused = set(pr_urls)
+    candidates = [t for t in ready if t.page_id not in reused]
+    candidate_paths = [prepared[t.page_id][1] for t in candidates]
+    changed = set(_GIT_WORKER.submit(changed_mocks, repo_root, candidate_paths).result())
+    unchanged = {t.page_id for t in candidates if prepared[t.page_id][1] not in changed}
+    new_tasks = [t for t in candidates if t.page_id not in unchanged]
+    checks = None
+    if new_tasks:
+        try:
+            pr: Optional[Dict[str, Any]] = open_batch_pr(
+                repo_root, cfg, new_tasks, [prepared[t.page_id][1] for t in new_tasks]
+            )
+        except Exception as exc:
+            # Only the batched tasks depend on this PR; reused and unchanged tasks still finish below.
+            print(f"Batch PR failed: {exc}", file=sys.stderr)
+            failed += len(new_tasks)
+            pr = None
+        if pr is not None:
+            for task in new_tasks:
+                pr_urls[task.page_id] = pr["html_url"]
+                if state:
+                    state.put_pr(task.page_id, pr["html_url"])
+            try:
+                checks = wait_for_checks(cfg, pr["head"]["sha"])
+            except Exception as exc:
+                # The PR exists now; record the failure as the report rather than leaving every page untouched.
+                print(f"Check polling failed: {exc}", file=sys.stderr)
+                checks = f"check polling failed: {exc}"
+
+    futures = {
+        pool.submit(finish_without_pr, cfg, state, task, prepared[task.page_id][0], "no mock changes"): task
+        for task in ready
+        if task.page_id in unchanged
+    }
+    futures.update({
+        pool.submit(
+            finish_task,
+            cfg,
+            state,
+            task,
+            prepared[task.page_id][0],
+            pr_urls[task.page_id],
+            None if task.page_id in reused else checks,
+        ): task
+        for task in ready
+        if task.page_id in pr_urls
+    })
+    return failed + report_results(futures)
 
 
 def main() -> int:
@@ -229,49 +734,19 @@ def main() -> int:
         print("No tasks in status=待处理")
         return 0
 
-    for task in tasks:
-        spec = build_spec(task)
-        acceptance_text = append_section(task.acceptance, "Spec", spec)
-        print(f"Updating Notion task: {task.title}")
-        update_notion_acceptance(cfg, task.page_id, acceptance_text, status="进行中")
-
-        mock_path = ensure_mock(task, repo_root)
-        validate_mock(mock_path)
-        print(f"Mock file: {mock_path}")
-
-        if cfg.dry_run:
-            print("DRY_RUN=1, skipping git/gh actions")
-            continue
-
-        branch = git_branch_name(cfg.branch_prefix, task)
-        create_branch_and_commit(repo_root, branch, f"Add mock for {task.title}")
-        run(["git", "push", "-u", "origin", branch], cwd=repo_root)
-
-        pr_body = (
-            "## 需求摘要\n- 自动生成\n\n"
-            "## 变更说明\n- 新增 mock 文件\n\n"
-            "## 测试结果\n- Mock：通过\n\n"
-            "## 自检清单\n"
-            "- [x] 覆盖主要路径与边界情况\n"
-            "- [x] mock 文件存在且字段完整\n"
-            "- [x] 失败场景有明确返回或处理\n"
-            "- [x] 变更已记录到文档/Notion\n\n"
-            "## 风险/注意事项\n- 待补充\n"
-        )
-        pr_url = gh_create_pr(repo_root, task.title, pr_body)
-
-        updated_text = append_section(acceptance_text, "PR", pr_url)
-        updated_text = append_section(updated_text, "Self Review", self_review_summary())
-
-        if os.environ.get("WAIT_FOR_CI", "").strip() == "1":
-            checks = gh_wait_for_checks(repo_root, pr_url)
-            updated_text = append_section(updated_text, "Test Report", checks)
-            update_notion_acceptance(cfg, task.page_id, updated_text, status="待测试")
+    state = TaskStateStore(STATE_DB_PATH) if cfg.notion_cache else None
+    if cfg.workers > 16:
+        # Keep a pooled connection per worker; otherwise concurrent PATCHes overflow the
+        # pool and urllib3 discards the extra connections, paying a new handshake each time.
+        _mount_adapters(_SESSION, cfg.workers)
+    with ThreadPoolExecutor(max_workers=cfg.workers) as pool:
+        if cfg.batch_pr and not cfg.dry_run:
+            failed = process_batch(cfg, repo_root, tasks, state, pool)
         else:
-            update_notion_acceptance(cfg, task.page_id, updated_text, status="待测试")
-        print(f"PR created: {pr_url}")
+            futures = {pool.submit(process_task, cfg, repo_root, task, state): task for task in tasks}
+            failed = report_results(futures)
 
-    return 0
+    return 1 if failed else 0
 
 
 if __name__ == "__main__":